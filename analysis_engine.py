@@ -0,0 +1,318 @@
+"""Transcript analysis engine: lexicons, the term matcher and sentiment scoring
+
+Kept free of Streamlit so bulk analysis can run it in worker processes; app.py
+imports everything it renders from here.
+"""
+import functools
+import re
+import time
+
+import numpy as np
+
+SAMPLE_CONTENT = {
+    "Medspa": {
+        "procedures": ["Botox", "dermal filler", "chemical peel", "lip filler"],
+        "areas": ["forehead lines", "crow's feet", "nasolabial folds", "lips"],
+    },
+    "Explant": {
+        "procedures": ["breast implant removal", "en bloc capsulectomy", "breast lift"],
+        "areas": ["implant capsule", "chest wall", "incision site"],
+    },
+    "Venous": {
+        "procedures": ["sclerotherapy", "endovenous laser ablation", "compression stockings"],
+        "areas": ["varicose veins", "spider veins", "lower legs"],
+    },
+    "General": {
+        "procedures": ["consultation", "skin assessment", "treatment plan"],
+        "areas": ["overall health", "skin concerns", "medication history"],
+    },
+    "Dermatology": {
+        "procedures": ["laser resurfacing", "microneedling", "topical retinoid"],
+        "areas": ["acne scarring", "pigmentation", "skin texture"],
+    },
+}
+
+SAMPLE_SIDE_EFFECTS = ["bruising", "swelling", "headache", "numbness", "infection", "scarring", "itching", "redness"]
+
+ANALYSIS_THEMES = {
+    "Patient concerns": ["worried", "concerned", "nervous", "question", "afraid", "anxious"],
+    "Treatment options": ["treatment", "procedure", "option", "candidate", "treatment plan"],
+    "Cost discussion": ["cost", "costs", "price", "insurance", "payment plan", "financing", "cover"],
+    "Side effects": SAMPLE_SIDE_EFFECTS + ["side effect", "pain"],
+    "Recovery": ["recovery", "aftercare", "downtime", "follow-up", "heal"],
+    "Satisfaction": ["happy", "thank you", "confident", "great result", "clearly", "comfortable"],
+}
+
+ANALYSIS_TYPE_THEMES = {
+    "Side Effects Detection": ["Side effects"],
+    "Patient Satisfaction": ["Satisfaction", "Patient concerns"],
+    "Cost Analysis": ["Cost discussion"],
+}
+
+MEDICAL_ENTITY_DICTIONARY = {
+    "Procedure": sorted({term for content in SAMPLE_CONTENT.values() for term in content["procedures"]}),
+    "Treatment area": sorted({term for content in SAMPLE_CONTENT.values() for term in content["areas"]}),
+    "Side effect": sorted(SAMPLE_SIDE_EFFECTS + ["pain", "complication", "complications", "side effect", "side effects"]),
+    "Clinical finding": [
+        "allergies", "blood pressure", "heart rate", "temperature", "medication", "anesthesia", "vitals",
+        "follow-up", "recovery", "contraindication",
+    ],
+}
+
+POSITIVE_WORDS = {"great", "happy", "thank", "confident", "clearly", "good", "quick", "comfortable", "sense"}
+NEGATIVE_WORDS = {"worried", "nervous", "concerned", "afraid", "pain", "severe", "infection", "can't", "anxious"}
+
+NEGATION_PATTERN = re.compile(r"\b(no|not|didn't|don't|never|without|haven't)\b[^.?!]{0,30}$", re.IGNORECASE)
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+
+SENTIMENT_TOKEN_PATTERN = re.compile(r"[a-z']+")
+SENTIMENT_NEGATORS = {"no", "not", "never", "without", "didn't", "don't", "haven't", "isn't", "wasn't", "won't"}
+SENTIMENT_NEGATION_WINDOW = 3
+SENTIMENT_LABELS = ["Negative", "Neutral", "Positive", "Very Positive"]
+SENTIMENT_ASPECTS = {
+    # Aspect: words marking a segment (one speaker turn) as part of the aspect; None covers every segment
+    "Overall Consultation": None,
+    "Treatment Discussion": {
+        word for content in SAMPLE_CONTENT.values() for term in content["procedures"] for word in term.split()
+    } | {"treatment", "procedure", "recovery", "aftercare", "downtime", "result", "results", "option"},
+    "Cost Conversation": {"cost", "costs", "price", "insurance", "financing", "payment", "pay", "afford", "expensive", "cover"},
+    "Provider Interaction": {"you", "your", "doctor", "explain", "explaining", "explained", "questions", "listen"},
+}
+PROVIDER_SPEAKER_TOKENS = {"dr", "doctor", "provider"}
+
+STOPWORDS = {"the", "and", "for", "with", "what", "about", "this", "that", "from", "across", "transcripts"}
+
+
+def analysis_terms(analysis_type, params):
+    """Map an analysis type and its parameters to {category: [terms]}"""
+    if analysis_type == "Keyword Search":
+        keywords = [k.strip() for k in params.get("keywords", "").split(",") if k.strip()]
+        return {"Keyword match": keywords}
+    if analysis_type == "Medical Entity Extraction":
+        return MEDICAL_ENTITY_DICTIONARY
+    if analysis_type == "Custom Query":
+        words = re.findall(r"[A-Za-z][A-Za-z'-]{3,}", params.get("custom_query", ""))
+        return {"Query match": [w for w in words if w.lower() not in STOPWORDS]}
+    if analysis_type == "Sentiment Analysis":
+        return {"Positive sentiment": sorted(POSITIVE_WORDS), "Negative sentiment": sorted(NEGATIVE_WORDS)}
+    themes = ANALYSIS_TYPE_THEMES.get(analysis_type, list(ANALYSIS_THEMES))
+    return {theme: ANALYSIS_THEMES[theme] for theme in themes}
+
+
+def score_sentiment_batch(texts):
+    """Lexicon sentiment per aspect for many transcripts in one set of NumPy operations
+
+    Every line is a segment. Tokens are mapped to polarity, negator and aspect flags
+    through their unique vocabulary; a negator up to SENTIMENT_NEGATION_WINDOW tokens
+    earlier in the same segment flips polarity. Positive and negative hits are summed
+    per segment, then per file over the segments attributed to each aspect.
+    Returns ({aspect: scores in [0, 1], 0.5 neutral}, {aspect: segment counts}).
+    """
+    tokens = []
+    segment_lengths = []
+    segment_files = []
+    for file_index, text in enumerate(texts):
+        for line in text.lower().split("\n"):
+            words = SENTIMENT_TOKEN_PATTERN.findall(line)
+            if words:
+                tokens += words
+                segment_lengths.append(len(words))
+                segment_files.append(file_index)
+    if not tokens:
+        neutral = np.full(len(texts), 0.5)
+        return {aspect: neutral for aspect in SENTIMENT_ASPECTS}, {aspect: np.zeros(len(texts)) for aspect in SENTIMENT_ASPECTS}
+
+    vocabulary, token_ids = np.unique(np.array(tokens), return_inverse=True)
+    polarity = np.array(
+        [1 if word in POSITIVE_WORDS else -1 if word in NEGATIVE_WORDS else 0 for word in vocabulary], dtype=np.int8
+    )[token_ids]
+    negator = np.isin(vocabulary, list(SENTIMENT_NEGATORS))[token_ids]
+    segment_ids = np.repeat(np.arange(len(segment_lengths)), segment_lengths)
+
+    negated = np.zeros(len(tokens), dtype=bool)
+    for distance in range(1, SENTIMENT_NEGATION_WINDOW + 1):
+        negated[distance:] |= negator[:-distance] & (segment_ids[distance:] == segment_ids[:-distance])
+    polarity = np.where(negated, -polarity, polarity)
+
+    segment_count = len(segment_lengths)
+    positive = np.bincount(segment_ids, weights=polarity > 0, minlength=segment_count)
+    negative = np.bincount(segment_ids, weights=polarity < 0, minlength=segment_count)
+    segment_files = np.array(segment_files)
+    first_tokens = token_ids[np.cumsum(segment_lengths) - segment_lengths]
+    provider_segments = np.isin(vocabulary, list(PROVIDER_SPEAKER_TOKENS))[first_tokens]
+
+    scores = {}
+    segments = {}
+    for aspect, terms in SENTIMENT_ASPECTS.items():
+        if terms is None:
+            in_aspect = np.ones(segment_count, dtype=bool)
+        else:
+            in_aspect = np.bincount(
+                segment_ids, weights=np.isin(vocabulary, list(terms))[token_ids], minlength=segment_count
+            ) > 0
+            if aspect == "Provider Interaction":
+                in_aspect |= provider_segments
+        file_positive = np.bincount(segment_files, weights=positive * in_aspect, minlength=len(texts))
+        file_negative = np.bincount(segment_files, weights=negative * in_aspect, minlength=len(texts))
+        hits = file_positive + file_negative
+        scores[aspect] = np.round(np.where(hits > 0, 0.5 + 0.5 * (file_positive - file_negative) / np.maximum(hits, 1), 0.5), 2)
+        segments[aspect] = np.bincount(segment_files, weights=in_aspect, minlength=len(texts))
+    return scores, segments
+
+
+def score_sentiment(text):
+    """Overall lexicon sentiment score of one transcript in [0, 1], 0.5 being neutral"""
+    scores, _ = score_sentiment_batch([text])
+    return float(scores["Overall Consultation"][0])
+
+
+def sentiment_buckets(scores):
+    """Index into SENTIMENT_LABELS for every score in an array"""
+    scores = np.asarray(scores)
+    return (scores >= 0.4).astype(np.int8) + (scores >= 0.6) + (scores > 0.8)
+
+
+def sentiment_label(score):
+    return SENTIMENT_LABELS[int(sentiment_buckets(score))]
+
+
+def match_confidence(term, text, offset):
+    """Heuristic confidence for a lexicon match at offset in text"""
+    # Longer, multi-word terms are more specific; a nearby negation weakens the match
+    confidence = min(0.99, 0.7 + 0.025 * min(len(term), 10) + 0.05 * term.count(" "))
+    if NEGATION_PATTERN.search(text[max(0, offset - 40):offset]):
+        confidence -= 0.3
+    return round(confidence, 2)
+
+
+class TermMatcher:
+    """Aho-Corasick automaton over word tokens matching a whole term dictionary in one pass
+
+    Terms are tokenized like transcripts, so matches always fall on word boundaries and
+    each transcript is scanned once regardless of dictionary size.
+    """
+
+    def __init__(self, categories, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.categories = [category for category, _ in categories]
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for code, (category, terms) in enumerate(categories):
+            for term in terms:
+                words = [self._fold(w) for w in TOKEN_PATTERN.findall(term)]
+                if not words:
+                    continue
+                state = 0
+                for word in words:
+                    if word not in self.goto[state]:
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.outputs.append([])
+                        self.goto[state][word] = len(self.goto) - 1
+                    state = self.goto[state][word]
+                if all(existing[0] != code for existing in self.outputs[state]):
+                    self.outputs[state].append((code, term, len(words)))
+
+        # Breadth-first failure links; each state also inherits the outputs of its failure state
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, target in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[target] = self.goto[fallback].get(word, 0)
+                self.outputs[target] = self.outputs[target] + self.outputs[self.fail[target]]
+                queue.append(target)
+
+    def _fold(self, word):
+        return word if self.case_sensitive else word.lower()
+
+    def find(self, text):
+        """Yield (start, end, category code, term) for every dictionary occurrence in text
+
+        Category codes index self.categories, in dictionary order.
+        """
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        recent = []
+        for match in TOKEN_PATTERN.finditer(text):
+            word = self._fold(match.group(0))
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            recent.append(match.start())
+            for code, term, length in outputs[state]:
+                yield recent[-length], match.end(), code, term
+
+    def __len__(self):
+        return len(self.goto)
+
+
+@functools.lru_cache(maxsize=32)
+def get_term_matcher(categories, case_sensitive=False):
+    """Build the matcher for a ((category, (terms, ...)), ...) dictionary once per process"""
+    return TermMatcher(categories, case_sensitive)
+
+
+def term_dictionary(analysis_type, params):
+    """analysis_terms in the hashable form get_term_matcher caches on"""
+    return tuple((category, tuple(terms)) for category, terms in analysis_terms(analysis_type, params).items())
+
+
+def analysis_categories(analysis_type, params):
+    """Category names in the order their codes are assigned by the term matcher"""
+    return [category for category, _ in term_dictionary(analysis_type, params)]
+
+
+def finding_columns(codes, confidence, offsets, terms, contexts):
+    """Per-file findings as the column arrays FindingsTable concatenates"""
+    return {
+        "category": np.array(codes, dtype=np.int32),
+        "confidence": np.array(confidence, dtype=np.float64),
+        "offset": np.array(offsets, dtype=np.int64),
+        "term": terms,
+        "context": contexts,
+    }
+
+
+def extract_raw_findings(text, analysis_type, params):
+    """Find every lexicon match for an analysis type, before threshold and limit filtering
+
+    Returns finding_columns: category codes into analysis_categories, confidence and
+    offset arrays, and the matched term and line of every finding.
+    """
+    matcher = get_term_matcher(term_dictionary(analysis_type, params), bool(params.get("case_sensitive")))
+    codes, confidence, offsets, terms, contexts = [], [], [], [], []
+    for start, end, code, term in matcher.find(text):
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", end)
+        codes.append(code)
+        confidence.append(match_confidence(term, text, start))
+        offsets.append(start)
+        terms.append(text[start:end])
+        contexts.append(text[line_start:line_end if line_end != -1 else len(text)])
+    return finding_columns(codes, confidence, offsets, terms, contexts)
+
+
+def analyze_texts(texts, analysis_type, params):
+    """Raw findings and sentiment for a batch of transcripts; the unit of work sent to analysis processes
+
+    Sentiment is scored for the whole batch in one call, and each text is credited
+    an equal share of that time on top of its own term matching.
+    """
+    if not texts:
+        return []
+    start = time.perf_counter()
+    scores, _ = score_sentiment_batch(texts)
+    sentiment_share = (time.perf_counter() - start) / len(texts)
+    results = []
+    for text, sentiment in zip(texts, scores["Overall Consultation"].tolist()):
+        start = time.perf_counter()
+        results.append({
+            "raw_findings": extract_raw_findings(text, analysis_type, params),
+            "sentiment": sentiment,
+            "elapsed": time.perf_counter() - start + sentiment_share,
+        })
+    return results
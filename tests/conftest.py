@@ -0,0 +1,26 @@
+"""Shared fixtures
+
+analysis_engine is imported directly. app.py is a Streamlit script, so the `app`
+fixture executes its definitions without the page rendering at the bottom.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("A360_DATA_DIR", str(tmp_path_factory.mktemp("data")))
+        path = os.path.join(ROOT, "app.py")
+        with open(path, encoding="utf-8") as script:
+            source = script.read()
+        module = types.ModuleType("app")
+        module.__file__ = path
+        exec(compile(source[:source.index("# Main application logic")], path, "exec"), module.__dict__)
+        yield module
@@ -0,0 +1,70 @@
+import random
+import re
+
+import pytest
+
+from analysis_engine import (
+    ANALYSIS_THEMES, MEDICAL_ENTITY_DICTIONARY, TOKEN_PATTERN, TermMatcher, analyze_texts, extract_raw_findings,
+    score_sentiment,
+)
+
+FILLER = ["the", "patient", "said", "we", "will", "review", "options", "today", "Doctor", "Patient"]
+SEPARATORS = [" ", "  ", ", ", ". ", "\n", ": ", " - "]
+
+
+def random_text(rng, vocabulary, words=400):
+    """Words drawn from the dictionary terms and some filler, in random case and spacing"""
+    parts = []
+    for _ in range(words):
+        word = rng.choice(vocabulary)
+        parts.append(rng.choice([word, word.lower(), word.upper(), word.title()]))
+        parts.append(rng.choice(SEPARATORS))
+    return "".join(parts)
+
+
+def regex_matches(categories, text, case_sensitive=False):
+    """Reference: one word-boundary regex scan per dictionary term"""
+    flags = 0 if case_sensitive else re.IGNORECASE
+    found = set()
+    for code, (_, terms) in enumerate(categories):
+        for term in terms:
+            words = TOKEN_PATTERN.findall(term)
+            pattern = re.compile(r"(?=(?<!\w)(" + r"\W+".join(map(re.escape, words)) + r")(?!\w))", flags)
+            found.update((match.start(1), match.end(1), code) for match in pattern.finditer(text))
+    return found
+
+
+@pytest.mark.parametrize("dictionary", [MEDICAL_ENTITY_DICTIONARY, ANALYSIS_THEMES], ids=["entities", "themes"])
+@pytest.mark.parametrize("case_sensitive", [False, True])
+def test_term_matcher_agrees_with_regex_scan(dictionary, case_sensitive):
+    categories = tuple((category, tuple(terms)) for category, terms in dictionary.items())
+    vocabulary = FILLER + [word for _, terms in categories for term in terms for word in TOKEN_PATTERN.findall(term)]
+    matcher = TermMatcher(categories, case_sensitive)
+    rng = random.Random(7)
+    for _ in range(20):
+        text = random_text(rng, vocabulary)
+        found = {(start, end, code) for start, end, code, _ in matcher.find(text)}
+        assert found == regex_matches(categories, text, case_sensitive)
+
+
+def test_term_matcher_reports_overlapping_terms():
+    matcher = TermMatcher((("Short", ("side",)), ("Long", ("side effect", "effect"))))
+    found = sorted((start, end, matcher.categories[code]) for start, end, code, _ in matcher.find("a side effect"))
+    assert found == [(2, 6, "Short"), (2, 13, "Long"), (7, 13, "Long")]
+
+
+def test_analyze_texts_matches_per_text_analysis():
+    texts = [
+        "Patient: I'm worried about the cost and financing.\nDoctor: We have payment plans.",
+        "Patient: Thank you, that was great and clear.",
+        "",
+    ]
+    results = analyze_texts(texts, "Cost Analysis", {})
+    assert len(results) == len(texts)
+    for text, result in zip(texts, results):
+        expected = extract_raw_findings(text, "Cost Analysis", {})
+        assert result["sentiment"] == score_sentiment(text)
+        assert result["raw_findings"]["offset"].tolist() == expected["offset"].tolist()
+        assert result["raw_findings"]["term"] == expected["term"]
+        assert result["elapsed"] >= 0
+    assert analyze_texts([], "Cost Analysis", {}) == []
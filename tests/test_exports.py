@@ -0,0 +1,89 @@
+import re
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+
+SHEET_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+COLUMNS = ["file", "term", "confidence", "offset", "note"]
+ROWS = [
+    ["a.txt", "side effect", 0.95, 120, None],
+    ["b.txt", "<insurance> & \"payment\"", 0.7, 0, "ctrl\x01char"],
+    ["c.txt", "résumé — 痛い", 1, 99999, True],
+] + [[f"f{i}.txt", "pain " * (i % 7), i / 100, i, ""] for i in range(300)]
+REPORT = ["ANALYSIS REPORT", "═" * 20, "", "Findings ≥ 0.8: 3", "└─ (nested) \\ line"]
+
+
+def read_sheet(package, number):
+    """Cell values of a worksheet, row by row, as the strings Excel would show"""
+    root = ElementTree.fromstring(package.read(f"xl/worksheets/sheet{number}.xml"))
+    return [
+        [
+            "".join(cell.itertext()) if cell.get("t") == "inlineStr" else cell.find(SHEET_NAMESPACE + "v").text
+            for cell in row
+        ]
+        for row in root.iter(SHEET_NAMESPACE + "row")
+    ]
+
+
+def expected_cell(value):
+    if isinstance(value, bool) or value is None or not isinstance(value, (int, float)):
+        return "" if value is None else re.sub("[\x00-\x08\x0b\x0c\x0e-\x1f]", "", str(value))
+    return str(value)
+
+
+@pytest.mark.parametrize("report", [None, REPORT])
+def test_xlsx_export_round_trips_rows(app, tmp_path, report):
+    path = tmp_path / "export.xlsx"
+    app.write_xlsx_export(path, COLUMNS, iter(ROWS), report)
+    with zipfile.ZipFile(path) as package:
+        assert package.testzip() is None
+        workbook = ElementTree.fromstring(package.read("xl/workbook.xml"))
+        sheets = [sheet.get("name") for sheet in workbook.iter(SHEET_NAMESPACE + "sheet")]
+        assert sheets == (["Data", "Report"] if report else ["Data"])
+        assert read_sheet(package, 1) == [COLUMNS] + [[expected_cell(value) for value in row] for row in ROWS]
+        if report:
+            assert read_sheet(package, 2) == [[line] for line in report]
+
+
+def expected_pdf_lines(app, columns, rows, report):
+    """Reference: the report, a blank line, the header and one line per row, wrapped to the page width"""
+    lines = (report + [""] if report else []) + [" | ".join(columns)] + [
+        " | ".join("" if value is None else str(value) for value in row) for row in rows
+    ]
+    wrapped = []
+    for line in lines:
+        wrapped += [line[i:i + app.PDF_LINE_CHARS] for i in range(0, len(line), app.PDF_LINE_CHARS)] or [""]
+    # Courier with WinAnsiEncoding: what iter_pdf_content_lines reads back as Latin-1
+    return [line.translate(app.PDF_TEXT_REPLACEMENTS).encode("cp1252", "ignore").decode("latin-1") for line in wrapped]
+
+
+@pytest.mark.parametrize("report", [None, REPORT])
+def test_pdf_export_text_and_structure(app, tmp_path, report):
+    path = tmp_path / "export.pdf"
+    app.write_pdf_export(path, COLUMNS, iter(ROWS), report)
+    data = path.read_bytes()
+    assert data.startswith(b"%PDF-1.4") and data.rstrip().endswith(b"%EOF")
+
+    # Every cross-reference entry points at the object it names
+    xref = int(re.search(rb"startxref\s+(\d+)", data).group(1))
+    assert data[xref:xref + 4] == b"xref"
+    count = int(re.match(rb"xref\s+0 (\d+)", data[xref:]).group(1))
+    entries = re.findall(rb"(\d{10}) \d{5} n", data[xref:])
+    assert len(entries) == count - 1
+    for number, offset in enumerate(entries, 1):
+        assert data[int(offset):].startswith(b"%d 0 obj" % number)
+
+    expected = expected_pdf_lines(app, COLUMNS, ROWS, report)
+    assert list(app.iter_pdf_content_lines(data)) == expected
+    pages = -(-len(expected) // app.PDF_LINES_PER_PAGE)
+    assert data.count(b"/Type /Page ") + data.count(b"/Type /Page>") == pages
+
+
+def test_pdf_export_reads_back_with_pypdf(app, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    path = tmp_path / "export.pdf"
+    app.write_pdf_export(path, COLUMNS, iter(ROWS[:3]), REPORT)
+    reader = pypdf.PdfReader(path)
+    text = "\n".join(page.extract_text() for page in reader.pages)
+    assert "ANALYSIS REPORT" in text and "side effect" in text
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from analysis_engine import finding_columns
+
+
+def random_results(rng, files=40):
+    results = []
+    for _ in range(files):
+        count = rng.choice([0, 1, 3, 10, 40])
+        offsets = rng.sample(range(5000), count)
+        results.append({
+            "raw_findings": finding_columns(
+                [rng.randrange(3) for _ in range(count)],
+                [rng.choice([0.5, 0.7, 0.75, 0.9, 0.95, 1.0]) for _ in range(count)],
+                offsets,
+                [f"term{offset}" for offset in offsets],
+                [f"line {offset}" for offset in offsets],
+            ),
+            "elapsed": rng.random() / 100,
+            "sentiment": rng.random(),
+        })
+    return results
+
+
+def per_file_top(results, threshold, max_results):
+    """Reference: filter and rank each file's findings on its own"""
+    rows = []
+    for file_id, result in enumerate(results):
+        columns = result["raw_findings"]
+        findings = sorted(
+            (-confidence, offset, code, term)
+            for code, confidence, offset, term in zip(
+                columns["category"].tolist(), columns["confidence"].tolist(), columns["offset"].tolist(), columns["term"]
+            )
+            if confidence >= threshold
+        )
+        rows += [(file_id, code, -negated, offset, term) for negated, offset, code, term in findings[:max_results]]
+    return rows
+
+
+@pytest.mark.parametrize("threshold, max_results", [(0.0, 5), (0.75, 10), (0.9, 1), (0.99, 100), (1.1, 5)])
+def test_select_matches_per_file_top_n(app, threshold, max_results):
+    results = random_results(random.Random(max_results))
+    table = app.FindingsTable.from_results(["A", "B", "C"], results).select(threshold, max_results)
+    rows = list(zip(
+        table.file_ids.tolist(), table.category_codes.tolist(), table.confidence.tolist(),
+        table.offsets.tolist(), table.terms.tolist(),
+    ))
+    assert rows == per_file_top(results, threshold, max_results)
+    assert table.latency.tolist() == [result["elapsed"] for result in results]
+
+
+def test_from_results_without_files(app):
+    table = app.FindingsTable.from_results(["A"], [])
+    assert len(table.select(0.0, 10).offsets) == 0
@@ -0,0 +1,137 @@
+import os
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from analysis_engine import TOKEN_PATTERN
+
+SPECIALTIES = ["Cardiology", "Dermatology", "Plastic Surgery", "Orthopedics"]
+VISIT_TYPES = ["Consultation", "Follow-up", "Procedure"]
+WORDS = ["pain", "side", "effect", "side-effect", "Insurance", "payment", "plan", "don't", "Dr.", "Anderson", "ok"]
+
+
+def random_transcript(rng):
+    return "\n".join(
+        f"{rng.choice(['Doctor', 'Patient'])}: " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 15)))
+        for _ in range(rng.randint(1, 12))
+    )
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    return app.SQLiteTranscriptStore(os.path.join(tmp_path, "transcripts.sqlite"))
+
+
+@pytest.fixture
+def corpus(store):
+    rng = random.Random(11)
+    store.add_transcripts("test", [
+        (f"file_{i:03d}.txt", rng.choice(SPECIALTIES), rng.choice(VISIT_TYPES), "2024-01-01", random_transcript(rng))
+        for i in range(60)
+    ])
+    return store.list_transcripts("test")
+
+
+def naive_phrase_search(texts, phrase, case_sensitive=False):
+    """Reference: scan each text's tokens for the phrase's tokens in sequence"""
+    fold = (lambda token: token) if case_sensitive else str.lower
+    wanted = [fold(token) for token in TOKEN_PATTERN.findall(phrase)]
+    hits = set()
+    if not wanted:
+        return hits
+    for filename, text in texts.items():
+        tokens = list(TOKEN_PATTERN.finditer(text))
+        for i in range(len(tokens) - len(wanted) + 1):
+            window = tokens[i:i + len(wanted)]
+            if [fold(match.group(0)) for match in window] == wanted:
+                hits.add((filename, window[0].start(), text[window[0].start():window[-1].end()]))
+    return hits
+
+
+def index_search(index, phrase, case_sensitive=False):
+    filenames = {doc_id: filename for filename, (doc_id, _) in index.documents().items()}
+    return {
+        (filenames[doc_id], offset, matched)
+        for doc_id, offset, matched, _, _ in index.search(phrase, case_sensitive)
+    }
+
+
+@pytest.mark.parametrize("case_sensitive", [False, True])
+def test_keyword_index_matches_token_scan(app, store, corpus, tmp_path, case_sensitive):
+    index = app.KeywordIndex(os.path.join(tmp_path, "keyword_index.sqlite"))
+    index.ensure_indexed(corpus, store)
+    texts = {file["filename"]: text for file, text in app.load_transcript_texts(corpus, store)}
+    for phrase in ["pain", "side effect", "Insurance", "payment plan", "don't", "Dr. Anderson", "missing", "!!"]:
+        assert index_search(index, phrase, case_sensitive) == naive_phrase_search(texts, phrase, case_sensitive)
+
+
+def test_keyword_index_picks_up_changed_transcripts(app, store, corpus, tmp_path):
+    index = app.KeywordIndex(os.path.join(tmp_path, "keyword_index.sqlite"))
+    progress = []
+    index.ensure_indexed(corpus, store, lambda done, total: progress.append((done, total)))
+    assert progress[-1] == (len(corpus), len(corpus))
+
+    store.add_transcripts("test", [("file_000.txt", "Cardiology", "Consultation", "2024-01-01", "Doctor: zebra")], replace=True)
+    index.ensure_indexed(corpus, store)
+    assert index_search(index, "zebra") == {("file_000.txt", 8, "zebra")}
+    assert not any(filename == "file_000.txt" for filename, _, _ in index_search(index, "pain"))
+
+
+def test_add_transcripts_reports_names_taken_by_another_source(store, corpus):
+    conflicts = store.add_transcripts("uploads", [
+        ("file_001.txt", "Cardiology", "Consultation", "2024-01-01", "Doctor: mine"),
+        ("new.txt", "Cardiology", "Consultation", "2024-01-01", "Doctor: new"),
+    ], replace=True)
+    assert conflicts == {"file_001.txt": "test"}
+    assert [file["filename"] for file in store.list_transcripts("uploads")] == ["new.txt"]
+
+
+def random_rows(rng, count=300):
+    start = date(2024, 1, 1)
+    return [
+        (i, f"t_{i:04d}.txt", rng.choice(SPECIALTIES), rng.choice(VISIT_TYPES),
+         (start + timedelta(days=rng.randrange(120))).isoformat(), rng.randrange(1, 10000))
+        for i in range(count)
+    ]
+
+
+def naive_select(rows, specialties, visit_types, date_range):
+    """Reference: filter the rows one by one and sort them newest first"""
+    kept = [
+        row for row in rows
+        if (specialties is None or row[2] in specialties)
+        and (visit_types is None or row[3] in visit_types)
+        and (date_range is None or date_range[0].isoformat() <= row[4] <= date_range[1].isoformat())
+    ]
+    return [row[0] for row in sorted(kept, key=lambda row: (-date.fromisoformat(row[4]).toordinal(), row[1]))]
+
+
+def test_metadata_index_bitmaps_match_row_filter(app):
+    rng = random.Random(5)
+    rows = random_rows(rng)
+    index = app.MetadataIndex(rows)
+    for _ in range(200):
+        specialties = rng.choice([None, [], rng.sample(SPECIALTIES, rng.randint(1, 3)) + ["Unknown"]])
+        visit_types = rng.choice([None, rng.sample(VISIT_TYPES, rng.randint(1, 2))])
+        date_range = None
+        if rng.random() < 0.7:
+            first = date(2023, 12, 20) + timedelta(days=rng.randrange(150))
+            date_range = (first, first + timedelta(days=rng.randrange(60)))
+        positions = index.select(specialties, visit_types, date_range)
+        assert index.ids[positions].tolist() == naive_select(rows, specialties, visit_types, date_range)
+
+
+def test_metadata_index_files_and_selection(app):
+    rows = random_rows(random.Random(9), 50)
+    index = app.MetadataIndex(rows)
+    positions = index.select()
+    by_id = {row[0]: row for row in rows}
+    for file in index.files(positions):
+        _, filename, specialty, visit_type, visit_date, size = by_id[file["id"]]
+        assert (file["filename"], file["specialty"], file["type"], file["date"], file["size"]) == (
+            filename, specialty, visit_type, visit_date, size
+        )
+    toggled = {rows[0][0], rows[1][0]}
+    assert set(index.ids[index.selected(positions, {"default": True, "toggled": toggled})]) == set(by_id) - toggled
+    assert set(index.ids[index.selected(positions, {"default": False, "toggled": toggled})]) == toggled
@@ -0,0 +1,138 @@
+import math
+import random
+
+import pytest
+
+TEXTS = [
+    "",
+    " ",
+    "Doctor: Good morning.\nPatient: Hi!",
+    "word" * 9 + " a_b, c-d... (e)",
+    "Patient: Ça fait mal à l'épaule — 痛い 😀 ok",
+    "\n\n  spaced   out\twords  \n",
+]
+
+
+def random_transcript(rng, lines=60):
+    speakers = ["Doctor", "Patient"]
+    words = ["pain", "insurance", "follow-up", "recovery", "résumé", "thanks", "okay", "procedure", "x", "—"]
+    return "\n".join(
+        f"{speakers[i % 2]}: " + " ".join(rng.choice(words) for _ in range(rng.randint(1, 25)))
+        + rng.choice([".", "?", "!", ""])
+        for i in range(lines)
+    )
+
+
+def naive_word_piece_count(text, piece_length=4):
+    """Reference: walk the bytes, starting a token at each punctuation byte and every
+    piece_length bytes into a word, never on a UTF-8 continuation byte"""
+    count = 0
+    run = None
+    for position, byte in enumerate(text.encode("utf-8")):
+        char = chr(byte)
+        is_word = byte >= 0x80 or char.isalnum() or char == "_"
+        if is_word:
+            if run is None:
+                run = position
+            if byte & 0xC0 != 0x80 and (position - run) % piece_length == 0:
+                count += 1
+        else:
+            run = None
+            if not char.isspace():
+                count += 1
+    return count
+
+
+def naive_character_count(text):
+    return sum(1 for position, byte in enumerate(text.encode("utf-8")) if position % 4 == 0 and byte & 0xC0 != 0x80)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(3)
+    return TEXTS + [random_transcript(rng, rng.randint(1, 80)) for _ in range(30)]
+
+
+def test_word_piece_counts_match_reference(app, corpus):
+    tokenizer = app.WordPieceTokenizer()
+    assert [tokenizer.count(text) for text in corpus] == [naive_word_piece_count(text) for text in corpus]
+
+
+def test_character_counts_match_reference(app, corpus):
+    tokenizer = app.CharacterTokenizer()
+    assert [tokenizer.count(text) for text in corpus] == [naive_character_count(text) for text in corpus]
+
+
+@pytest.mark.parametrize("name", ["Word-piece (offline)", "Character estimate (4 chars/token)"])
+def test_batch_counts_match_single_counts(app, corpus, name):
+    tokenizer = app.TOKENIZERS[name]
+    assert tokenizer.count_batch(corpus).tolist() == [tokenizer.count(text) for text in corpus]
+    assert tokenizer.count_batch([]).tolist() == []
+
+
+def reassemble(text, chunks):
+    """Reference: locate each chunk in the text, checking it starts inside the previous
+    chunk (or right after it) and that together they cover the text"""
+    assert text.startswith(chunks[0])
+    start, end = 0, len(chunks[0])
+    for chunk in chunks[1:]:
+        position = text.find(chunk, start + 1)
+        assert start < position <= end
+        start, end = position, position + len(chunk)
+    assert end == len(text)
+
+
+@pytest.mark.parametrize("name", ["Word-piece (offline)", "Character estimate (4 chars/token)"])
+@pytest.mark.parametrize("max_chunk_tokens, overlap", [(50, 0), (120, 0), (120, 30), (64, 63)])
+def test_chunk_transcript_reassembles(app, name, max_chunk_tokens, overlap):
+    tokenizer = app.TOKENIZERS[name]
+    rng = random.Random(max_chunk_tokens + overlap)
+    for _ in range(10):
+        text = random_transcript(rng, rng.randint(1, 80))
+        chunks = app.chunk_transcript(text, tokenizer, max_chunk_tokens, overlap)
+        assert all(tokenizer.count(chunk) <= max_chunk_tokens for chunk in chunks)
+        if overlap == 0:
+            assert "".join(chunks) == text
+        else:
+            reassemble(text, chunks)
+
+
+def test_chunk_transcript_rejects_overlap_as_large_as_chunk(app):
+    with pytest.raises(ValueError):
+        app.chunk_transcript("Doctor: hello there", app.TOKENIZERS[app.DEFAULT_TOKENIZER], 10, 10)
+
+
+@pytest.mark.parametrize("overlap", [0, 25])
+def test_plan_token_budget_matches_per_text_arithmetic(app, overlap):
+    rng = random.Random(overlap)
+    texts = [random_transcript(rng, rng.randint(1, 120)) for _ in range(25)]
+    prompt = "Summarise the patient's concerns about {transcript}"
+    max_tokens = 8000
+    models = ["GPT-4", "Claude-3-Haiku", "GPT-3.5-Turbo"]
+    tokenizer = app.TOKENIZERS[app.DEFAULT_TOKENIZER]
+    plan = app.plan_token_budget(texts, prompt, models, max_tokens, app.DEFAULT_TOKENIZER, overlap)
+
+    prompt_tokens = tokenizer.count(prompt)
+    counts = [tokenizer.count(text) for text in texts]
+    assert plan["transcript_tokens"] == sum(counts)
+    assert plan["largest_transcript"] == max(counts)
+    assert plan["models"]["GPT-4"]["split_files"] > 0
+    for model in models:
+        spec = app.MODEL_CATALOG[model]
+        budget = spec["context"] - prompt_tokens - max_tokens
+        chunks = [1 if count <= budget else math.ceil((count - overlap) / (budget - overlap)) for count in counts]
+        input_tokens = sum(count + (n - 1) * overlap + n * prompt_tokens for count, n in zip(counts, chunks))
+        output_tokens = sum(chunks) * max_tokens
+        estimate = plan["models"][model]
+        assert estimate["requests"] == sum(chunks)
+        assert estimate["split_files"] == sum(n > 1 for n in chunks)
+        assert estimate["input_tokens"] == input_tokens
+        assert estimate["max_output_tokens"] == output_tokens
+        assert estimate["max_cost"] == pytest.approx(
+            input_tokens / 1000 * spec["input_price"] + output_tokens / 1000 * spec["output_price"]
+        )
+
+
+def test_plan_token_budget_flags_prompts_that_do_not_fit(app):
+    plan = app.plan_token_budget(["Doctor: hi"], "prompt", ["GPT-4"], 8192)
+    assert plan["models"]["GPT-4"]["error"] is not None